@@ -1,6 +1,14 @@
+import ast
+import bisect
+import collections
+import io
+import json
+import math
 import os
 import tokenize
-from radon.complexity import cc_visit
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from radon.visitors import ComplexityVisitor
 from pathlib import Path
 
 # Configuration Constants
@@ -44,90 +52,107 @@ AI_THRESHOLDS = {
     }
 }
 
+def _tier_table(tiers, fallback, fallback_first=False):
+    """Split a tier dict into ascending thresholds and bisect-indexed labels"""
+    ordered = sorted(tiers.items(), key=lambda item: item[1])
+    labels = [tier.upper() for tier, _ in ordered]
+    labels = [fallback] + labels if fallback_first else labels + [fallback]
+    return tuple(threshold for _, threshold in ordered), tuple(labels)
+
+# Tier tables flattened once at import for bisect lookups
+_COMMENT_THRESHOLDS, _COMMENT_LABELS = _tier_table(
+    CLAUDE_TOLERANCES['python']['comment_tiers'], 'POOR', fallback_first=True
+)
+_PY_CX_THRESHOLDS, _PY_CX_LABELS = _tier_table(CLAUDE_TOLERANCES['python']['complexity_tiers'], 'DANGER')
+_CONFIG_SIZE_THRESHOLDS, _CONFIG_SIZE_LABELS = _tier_table(CLAUDE_TOLERANCES['config']['size_tiers'], 'DANGER')
+
+_SAFETY = ('SIMPLE', 'SAFE', 'COMPLEX', 'DANGER')
+_SAFETY_IDX = {rating: idx for idx, rating in enumerate(_SAFETY)}
+
 PYTHON_EXTS = {'.py'}
 CONFIG_EXTS = {'.ini', '.cfg', '.conf', '.toml', '.yml', '.yaml', '.json'}
 
-def get_file_size(path):
-    """Get file size metrics with error handling"""
+def _max_analyzable_bytes(default=512 * 1024):
+    """Read the Python size limit from the environment, falling back on bad values"""
     try:
-        bytes_size = os.path.getsize(path)
-        return {
-            'bytes': bytes_size,
-            'kb': round(bytes_size / 1024, 1),
-            'mb': round(bytes_size / (1024 ** 2), 3)
-        }
-    except OSError:
-        return {'bytes': 0, 'kb': 0, 'mb': 0}
+        return int(os.environ.get('AI_MAINTAINABILITY_MAX_BYTES', default))
+    except ValueError:
+        return default
 
-def analyze_comments(file_path):
-    """Analyze comment density and quality with error handling"""
-    try:
-        comment_lines = 0
-        total_lines = 0
-        has_module_doc = False
+# Python files larger than this are rated DANGER without tokenizing or parsing
+MAX_ANALYZABLE_BYTES = _max_analyzable_bytes()
 
-        with open(file_path, 'rb') as f:
-            tokens = tokenize.tokenize(f.readline)
-            for tok in tokens:
-                if tok.type == tokenize.COMMENT:
-                    comment_lines += 1
+# Analysis cache, invalidated whenever the rating configuration changes
+CACHE_FILE = '.cache.json'
+CACHE_FINGERPRINT = (4, repr(CLAUDE_TOLERANCES), repr(AI_THRESHOLDS), MAX_ANALYZABLE_BYTES)
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.readlines()
-            total_lines = len(content)
-            if content:
-                has_module_doc = content[0].strip().startswith('"""') or \
-                                content[0].strip().startswith("'''")
+# Input-driven failures that mark a single file as unanalyzable
+ANALYSIS_ERRORS = (OSError, SyntaxError, ValueError, RecursionError, tokenize.TokenError)
 
-        density = round((comment_lines / total_lines * 100), 1) if total_lines > 0 else 0
-        quality = 'POOR'
-        
-        for tier, threshold in CLAUDE_TOLERANCES['python']['comment_tiers'].items():
-            if density >= threshold:
-                quality = tier.upper()
-                break
+_EXT_TO_TYPE = {
+    **{ext: 'python' for ext in PYTHON_EXTS},
+    **{ext: 'config' for ext in CONFIG_EXTS}
+}
 
-        if total_lines == 0 and has_module_doc:
-            quality = 'EXCELLENT'
+def size_metrics(bytes_size):
+    """Convert a raw byte count into size metrics"""
+    return {
+        'bytes': bytes_size,
+        'kb': round(bytes_size / 1024, 1),
+        'mb': round(bytes_size / (1024 ** 2), 3)
+    }
 
-        return {'comment_density': density, 'comment_quality': quality}
-    
-    except Exception as e:
-        print(f"Comment analysis failed for {file_path}: {str(e)}")
-        return {'comment_density': 0, 'comment_quality': 'ERROR'}
+def get_file_size(source):
+    """Get file size metrics from a path or stat result with error handling"""
+    try:
+        if isinstance(source, os.stat_result):
+            bytes_size = source.st_size
+        else:
+            bytes_size = os.path.getsize(source)
+        return size_metrics(bytes_size)
+    except OSError:
+        return {'bytes': 0, 'kb': 0, 'mb': 0}
+
+def _iter_files(root):
+    """Recursively yield DirEntry objects for regular files under root"""
+    try:
+        with os.scandir(root) as it:
+            entries = list(it)
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_files(entry.path)
+            elif entry.is_file():
+                yield entry
+        except OSError:
+            continue
+
+def comment_quality(density):
+    """Map a comment density percentage onto a quality tier"""
+    return _COMMENT_LABELS[bisect.bisect_right(_COMMENT_THRESHOLDS, density)]
 
 def adjust_safety(base_safety, comment_density):
     """Adjust safety rating based on comment quality"""
-    safety_order = ['SIMPLE', 'SAFE', 'COMPLEX', 'DANGER']
-    try:
-        idx = safety_order.index(base_safety)
-        if comment_density >= 25:
-            return safety_order[max(0, idx-1)]
-        elif comment_density < 10:
-            return safety_order[min(len(safety_order)-1, idx+1)]
-        return base_safety
-    except ValueError:
+    idx = _SAFETY_IDX.get(base_safety)
+    if idx is None:
         return base_safety
+    if comment_density >= 25:
+        return _SAFETY[max(0, idx-1)]
+    elif comment_density < 10:
+        return _SAFETY[min(len(_SAFETY)-1, idx+1)]
+    return base_safety
 
 def get_safety_rating(file_data):
     """Calculate safety rating with fallbacks"""
-    try:
-        file_type = file_data['type']
-        metric = file_data['complexity'] if file_type == 'python' else file_data['size']['kb']
-        tiers = CLAUDE_TOLERANCES[file_type]['complexity_tiers' if file_type == 'python' else 'size_tiers']
-        
-        for rating, threshold in tiers.items():
-            if metric <= threshold:
-                base_safety = rating.upper()
-                break
-        else:
-            base_safety = 'DANGER'
-
-        if file_type == 'python':
-            return adjust_safety(base_safety, file_data.get('comment_density', 0))
-        return base_safety
-    except KeyError:
-        return 'ERROR'
+    file_type = file_data.get('type')
+    if file_type == 'python':
+        base_safety = _PY_CX_LABELS[bisect.bisect_left(_PY_CX_THRESHOLDS, file_data['complexity'])]
+        return adjust_safety(base_safety, file_data.get('comment_density', 0))
+    if file_type == 'config':
+        return _CONFIG_SIZE_LABELS[bisect.bisect_left(_CONFIG_SIZE_THRESHOLDS, file_data['size']['kb'])]
+    return 'ERROR'
 
 def get_ai_recommendations(file_data):
     """Generate AI recommendations with enhanced safety checks"""
@@ -155,22 +180,37 @@ def get_ai_recommendations(file_data):
     except Exception:
         return ['Analysis Failed']
 
-def analyze_file(file_path):
-    """Robust file analysis with guaranteed type field"""
+def analyze_file(file_path, st=None):
+    """Robust file analysis with guaranteed type field, reusing a pre-fetched stat if given"""
     try:
         if os.path.basename(file_path) == 'report.py':
             return None
 
-        ext = os.path.splitext(file_path)[1].lower()
-        file_type = 'python' if ext in PYTHON_EXTS else 'config' if ext in CONFIG_EXTS else 'other'
-        
-        if file_type == 'other':
+        file_type = _EXT_TO_TYPE.get(os.path.splitext(file_path)[1].lower())
+        if file_type is None:
             return None
 
+        if file_type == 'python':
+            bytes_size = st.st_size if st is not None else os.path.getsize(file_path)
+            if bytes_size > MAX_ANALYZABLE_BYTES:
+                return {
+                    'path': os.path.abspath(file_path),
+                    'type': file_type,
+                    'size': size_metrics(bytes_size),
+                    'tokens': None,
+                    'complexity': None,
+                    'comment_density': None,
+                    'comment_quality': 'SKIPPED',
+                    'safety': 'DANGER',
+                    'recommendations': ['Human Review']
+                }
+
+        data = Path(file_path).read_bytes() if file_type == 'python' else None
+
         result = {
-            'path': str(Path(file_path).resolve()),
+            'path': os.path.abspath(file_path),
             'type': file_type,
-            'size': get_file_size(file_path),
+            'size': size_metrics(len(data)) if data is not None else get_file_size(st if st is not None else file_path),
             'tokens': 0,
             'complexity': 0,
             'comment_density': 0,
@@ -180,27 +220,39 @@ def analyze_file(file_path):
         }
 
         if file_type == 'python':
-            with open(file_path, 'rb') as f:
-                result['tokens'] = len(list(tokenize.tokenize(f.readline)))
+            # Parse once and share the tree for complexity and docstring detection
+            tree = ast.parse(data, filename=file_path)
+            result['complexity'] = sum(block.complexity for block in ComplexityVisitor.from_ast(tree).blocks)
+            has_module_doc = ast.get_docstring(tree) is not None
 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                result['complexity'] = sum(func.complexity for func in cc_visit(f.read()))
+            # Tokenize only for the raw token and comment counts
+            token_count = 0
+            comment_lines = 0
+            for tok in tokenize.tokenize(io.BytesIO(data).readline):
+                token_count += 1
+                if tok.type == tokenize.COMMENT:
+                    comment_lines += 1
 
-            comment_data = analyze_comments(file_path)
-            result.update(comment_data)
+            total_lines = (data.count(b'\n') + (not data.endswith(b'\n'))) if data else 0
+            density = round((comment_lines / total_lines * 100), 1) if total_lines > 0 else 0
+            quality = comment_quality(density)
+            if total_lines == 0 and has_module_doc:
+                quality = 'EXCELLENT'
+
+            result['tokens'] = token_count
+            result['comment_density'] = density
+            result['comment_quality'] = quality
         else:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                result['tokens'] = len(content.split())
+            result['tokens'] = len(Path(file_path).read_text(encoding='utf-8').split())
 
         result['safety'] = get_safety_rating(result)
         result['recommendations'] = get_ai_recommendations(result)
         return result
 
-    except Exception as e:
-        print(f"Critical error analyzing {file_path}: {str(e)}")
+    except ANALYSIS_ERRORS as e:
+        # Workers stay silent; main reports collected errors after the pool drains
         return {
-            'path': str(Path(file_path).resolve()),
+            'path': os.path.abspath(file_path),
             'type': 'error',
             'size': {'bytes': 0, 'kb': 0, 'mb': 0},
             'tokens': 0,
@@ -208,39 +260,105 @@ def analyze_file(file_path):
             'comment_density': 0,
             'comment_quality': 'ERROR',
             'safety': 'ANALYSIS FAILED',
-            'recommendations': ['Human Review']
+            'recommendations': ['Human Review'],
+            'error': str(e)
         }
 
-def generate_report(files):
-    """Generate error-resistant report"""
-    valid_files = [f for f in files if f and f.get('type') in ('python', 'config')]
-    
-    md = [
-        "# AI Maintainability Assessment Report",
-        "## Analysis Summary",
-        "| Path | Type | Size (KB) | Tokens | Complexity | Comments | Safety | Models |",
-        "|------|------|-----------|--------|------------|----------|--------|--------|"
+def is_valid_cache_entry(entry):
+    """Check a cache entry has the [path, mtime_ns, size, result] shape main relies on"""
+    if not isinstance(entry, list) or len(entry) != 4:
+        return False
+    path, mtime_ns, size, result = entry
+    return (
+        isinstance(path, str)
+        and isinstance(mtime_ns, int)
+        and isinstance(size, int)
+        and isinstance(result, dict)
+        and result.get('type') in ('python', 'config')
+        and isinstance(result.get('size'), dict)
+        and isinstance(result.get('safety'), str)
+        and isinstance(result.get('recommendations'), list)
+        and all(isinstance(model, str) for model in result['recommendations'])
+        and (result.get('complexity') is None or isinstance(result.get('complexity'), int))
+    )
+
+def load_cache(cache_path):
+    """Load cached analysis results keyed by (path, mtime_ns, size), dropping malformed caches"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        entries = cache['results']
+        if (
+            cache['fingerprint'] == list(CACHE_FINGERPRINT)
+            and isinstance(entries, list)
+            and all(is_valid_cache_entry(entry) for entry in entries)
+        ):
+            return {
+                (path, mtime_ns, size): result
+                for path, mtime_ns, size, result in entries
+            }
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return {}
+
+def save_cache(cache_path, results):
+    """Persist analysis results for the next run"""
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fingerprint': CACHE_FINGERPRINT,
+                'results': [[*key, result] for key, result in results.items()]
+            }, f)
+    except OSError as e:
+        print(f"Could not write analysis cache {cache_path}: {str(e)}")
+
+Row = collections.namedtuple('Row', 'path type kb tokens complexity comments safety models')
+ROW_TEMPLATE = "| `{}` | {} | {} | {} | {} | {} | **{}** | {} |\n"
+
+def to_row(file):
+    """Normalize an analysis result into a report Row"""
+    tokens = file.get('tokens', 0)
+    complexity = file.get('complexity')
+    density = file.get('comment_density', 0)
+    density = f"{density}%" if density is not None else "N/A"
+    comments = (
+        f"{density} ({file.get('comment_quality', 'N/A')})" 
+        if file['type'] == 'python' 
+        else "N/A"
+    )
+    return Row(
+        file.get('path', ''),
+        file.get('type', 'unknown'),
+        file.get('size', {}).get('kb', 0),
+        tokens if tokens is not None else 'N/A',
+        complexity if complexity is not None else 'N/A',
+        comments,
+        file.get('safety', 'ERROR'),
+        ' • '.join(file.get('recommendations', ['Human Review']))
+    )
+
+def write_report(files, fp):
+    """Stream an error-resistant report to an open text file"""
+    # (rank, path, row) triples; unmeasured (skipped) complexity ranks above any real score
+    ranked = [
+        (math.inf if f.get('complexity') is None else f['complexity'], f.get('path', ''), to_row(f))
+        for f in files if f and f.get('type') in ('python', 'config')
     ]
     
-    for file in sorted(valid_files, key=lambda x: (-x.get('complexity',0), x['path'])):
-        comments = (
-            f"{file.get('comment_density', 0)}% ({file.get('comment_quality', 'N/A')})" 
-            if file['type'] == 'python' 
-            else "N/A"
-        )
-        
-        md.append(
-            f"| `{file.get('path', '')}` | "
-            f"{file.get('type', 'unknown')} | "
-            f"{file.get('size', {}).get('kb', 0)} | "
-            f"{file.get('tokens', 0)} | "
-            f"{file.get('complexity', 'N/A')} | "
-            f"{comments} | "
-            f"**{file.get('safety', 'ERROR')}** | "
-            f"{' • '.join(file.get('recommendations', ['Human Review']))} |"
-        )
+    fp.write(
+        "# AI Maintainability Assessment Report\n"
+        "## Analysis Summary\n"
+        "| Path | Type | Size (KB) | Tokens | Complexity | Comments | Safety | Models |\n"
+        "|------|------|-----------|--------|------------|----------|--------|--------|\n"
+    )
+    
+    # Two stable C-level sorts: by path, then by descending complexity rank
+    ranked.sort(key=itemgetter(1))
+    ranked.sort(key=itemgetter(0), reverse=True)
+    for _, _, row in ranked:
+        fp.write(ROW_TEMPLATE.format(*row))
     
-    md.extend([
+    fp.write('\n'.join([
         "\n## Safety Rating System",
         "### Python Files:",
         "- **SIMPLE** (≤15 CC): Safe for quick AI edits",
@@ -259,32 +377,66 @@ def generate_report(files):
         "- Poor docs (<10%) may worsen safety rating",
         "",
         "*Analysis based on Claude 3.5 capabilities (July 2024)*"
-    ])
-    
-    return '\n'.join(md)
+    ]))
 
 def main():
     """Main execution with enhanced error handling"""
-    files = []
     try:
-        for root, _, filenames in os.walk('.'):
-            for fn in filenames:
-                if fn == 'report.py':
-                    continue
-                
-                ext = os.path.splitext(fn)[1].lower()
-                if ext in PYTHON_EXTS | CONFIG_EXTS:
-                    full_path = os.path.join(root, fn)
-                    analysis = analyze_file(full_path)
-                    if analysis:
-                        files.append(analysis)
-        
-        report_dir = os.path.join(os.getcwd(), 'foundational')
+        # Walk from the resolved root so every entry path is already absolute.
+        # DirEntry objects can't be pickled, so ship each path with its stat result
+        root = Path('.').resolve()
+        report_dir = os.path.join(str(root), 'foundational')
+        cache_path = os.path.join(report_dir, CACHE_FILE)
+        paths, stats = [], []
+        for entry in _iter_files(str(root)):
+            if entry.name == 'report.py' or not _EXT_TO_TYPE.get(os.path.splitext(entry.name)[1].lower()):
+                continue
+            if entry.path == cache_path:
+                continue
+            try:
+                stats.append(entry.stat())
+            except OSError:
+                continue
+            paths.append(entry.path)
+
         os.makedirs(report_dir, exist_ok=True)
+
+        # Only files whose path, mtime or size changed since the last run are re-analyzed
+        cache = load_cache(cache_path)
+        fresh_cache = {}
+        files = []
+        pending_keys, pending_paths, pending_stats = [], [], []
+        for path, st in zip(paths, stats):
+            key = (path, st.st_mtime_ns, st.st_size)
+            cached = cache.get(key)
+            if cached is not None:
+                files.append(cached)
+                fresh_cache[key] = cached
+            else:
+                pending_keys.append(key)
+                pending_paths.append(path)
+                pending_stats.append(st)
+
+        if pending_paths:
+            # Files are independent and CPU-bound, so fan them out across cores
+            with ProcessPoolExecutor() as executor:
+                results = executor.map(analyze_file, pending_paths, pending_stats, chunksize=16)
+                for key, result in zip(pending_keys, results):
+                    if not result:
+                        continue
+                    files.append(result)
+                    if result['type'] != 'error':
+                        fresh_cache[key] = result
+
+        save_cache(cache_path, fresh_cache)
+
+        for file in files:
+            if file['type'] == 'error':
+                print(f"Critical error analyzing {file['path']}: {file['error']}")
         
         report_path = os.path.join(report_dir, 'report.md')
         with open(report_path, 'w', encoding='utf-8') as f:
-            f.write(generate_report(files))
+            write_report(files, f)
         
         print(f"Report generated successfully: {report_path}")
     